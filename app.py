@@ -1,8 +1,16 @@
 import math
+import os
 import streamlit as st
 import pydeck as pdk
+import numpy as np
 import pandas as pd
 import json
+import orjson
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
 
 st.title("Paris Bike Share Stations 📊")
 st.markdown(
@@ -13,34 +21,139 @@ st.markdown(
 
 file_path = "data/gbfs_all_station_paris_18h.json"
 
+# GBFS nests the station list under data.stations; some exports flatten
+# one or both levels, so each key is only descended when present.
+STATIONS_PATH = ("data", "stations")
+
+# The app only consumes these fields; everything else in the feed is
+# dropped at ingest. float32 is plenty for ratios and counts, while
+# coordinates stay float64 for the duplicate-offset arithmetic.
+STATION_COLUMNS = {
+    "name": object,
+    "vehicle_type": object,
+    "latitude": np.float64,
+    "longitude": np.float64,
+    "is_virtual_station": bool,
+    "availability_ratio": np.float32,
+    "avg_num_of_available": np.float32,
+}
+
+# Bump whenever the ingest schema above changes, so stale parquet caches
+# written for an older column set are not picked up.
+CACHE_VERSION = 2
+
+# Columns each layer actually references (position/color/radius accessors
+# plus the tooltip fields); everything else stays out of the serialized spec.
+DOCKED_SEND_COLS = [
+    "longitude",
+    "latitude",
+    "name",
+    "station_type",
+    "vehicle_type",
+    "info_line",
+]
+DOCKLESS_SEND_COLS = [
+    "longitude",
+    "latitude",
+    "radius",
+    "name",
+    "station_type",
+    "vehicle_type",
+    "info_line",
+]
+
+
+def cache_path_for(file_path):
+    """Build a parquet cache path keyed on the source file's mtime and size."""
+    key = f"{os.path.getmtime(file_path)}_{os.path.getsize(file_path)}_v{CACHE_VERSION}"
+    return os.path.join("data", ".cache", f"{key}.parquet")
+
+
+def columns_from_records(stations):
+    """Extract the consumed columns as typed arrays, one sweep per column.
+
+    Handing pandas the raw record list makes it probe every key of every
+    record and infer each dtype; pulling the fixed field set directly
+    into preallocated arrays skips both.
+    """
+    first = stations[0] if stations else {}
+    count = len(stations)
+    columns = {}
+    for name, dtype in STATION_COLUMNS.items():
+        if name not in first:
+            continue
+        if dtype is object or dtype is bool:
+            values = (rec.get(name) for rec in stations)
+            if dtype is bool:
+                values = (bool(v) for v in values)
+        else:
+            values = (
+                np.nan if rec.get(name) is None else rec.get(name)
+                for rec in stations
+            )
+        columns[name] = np.fromiter(values, dtype=dtype, count=count)
+    return columns
+
 
 @st.cache_data
 def load_data(file_path):
     """Load and process GBFS data."""
-    with open(file_path, "r") as f:
-        data = json.load(f)
-
-    if isinstance(data, dict) and "data" in data:
-        if "stations" in data["data"]:
-            stations_data = data["data"]["stations"]
-        else:
-            stations_data = data["data"]
-    else:
-        stations_data = data
-
-    return pd.DataFrame(stations_data)
-
-
-def ratio_to_color(ratio):
-    """Convert availability ratio to red-green color scale."""
-    if pd.isna(ratio):
-        return [128, 128, 128]
-
-    ratio = max(0, min(1, float(ratio)))
-    r = int((1 - ratio) * 255)
-    g = int(ratio * 255)
-    b = 0
-    return [r, g, b]
+    cache_path = cache_path_for(file_path)
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+
+    with open(file_path, "rb") as f:
+        stations_data = orjson.loads(f.read())
+
+    for key in STATIONS_PATH:
+        if isinstance(stations_data, dict) and key in stations_data:
+            stations_data = stations_data[key]
+
+    df = pd.DataFrame(columns_from_records(stations_data))
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    df.to_parquet(cache_path, compression="zstd")
+    return df
+
+
+# Feeds below this size are served fine by the NumPy path; the compiled
+# kernel only pays off once multi-city aggregation grows the table.
+NUMBA_MIN_ROWS = 100_000
+
+if njit is not None:
+
+    @njit(parallel=True, cache=True)
+    def _docked_kernel(ratio, norm, colors):
+        """Fused single-pass normalization + coloring for large feeds."""
+        for i in prange(len(ratio)):
+            x = ratio[i]
+            if math.isnan(x):
+                norm[i] = 0.5
+                colors[i, 0] = 128
+                colors[i, 1] = 128
+                colors[i, 2] = 128
+                continue
+            n = x / 100.0
+            if n < 0:
+                n = 0.0
+            elif n > 1:
+                n = 1.0
+            norm[i] = n
+            colors[i, 0] = int((1 - n) * 255)
+            colors[i, 1] = int(n * 255)
+            colors[i, 2] = 0
+
+
+def ratios_to_colors(ratios):
+    """Convert availability ratios to a red-green (N, 3) uint8 color matrix."""
+    arr = np.asarray(ratios, dtype=float)
+    nan_mask = np.isnan(arr)
+    clamped = np.clip(np.where(nan_mask, 0.0, arr), 0, 1)
+    colors = np.empty((len(clamped), 3), dtype=np.uint8)
+    colors[:, 0] = (1 - clamped) * 255
+    colors[:, 1] = clamped * 255
+    colors[:, 2] = 0
+    colors[nan_mask] = [128, 128, 128]
+    return colors
 
 
 def add_offset_to_duplicates(
@@ -70,40 +183,117 @@ def add_offset_to_duplicates(
     return df_copy
 
 
-def create_map_layers(df):
-    """Create map layers for docked and dockless stations."""
-    layers = []
-    df["is_virtual_station"] = df["is_virtual_station"].astype(bool)
+def prepare_station_data(df):
+    """Split stations into docked/dockless subsets with display columns.
 
-    df_docked = df[df["is_virtual_station"] == False].copy()
-    df_dockless = df[df["is_virtual_station"] == True].copy()
+    Returns the two subsets plus the docked color matrix, which stays a
+    compact (N, 3) uint8 array instead of an object column in the frame.
+    """
+    is_virtual = df["is_virtual_station"].astype(bool).to_numpy()
+    df["is_virtual_station"] = is_virtual
 
-    if len(df_docked) > 0:
-        df_docked["station_type"] = "Docked"
+    df_docked = df.loc[~is_virtual].reset_index(drop=True)
+    df_dockless = df.loc[is_virtual].reset_index(drop=True)
+    docked_colors = np.empty((0, 3), dtype=np.uint8)
 
-        df_docked["availability_ratio_normalized"] = df_docked[
-            "availability_ratio"
-        ].apply(
-            lambda x: (x / 100.0 if not pd.isna(x) else (x if not pd.isna(x) else 0.5))
-        )
-        df_docked["availability_display"] = df_docked["availability_ratio"].apply(
-            lambda x: f"{int(x)}%" if not pd.isna(x) else "N/A"
+    if len(df_docked) > 0:
+        # Derive every docked column from one pass over the availability array.
+        ratio = df_docked["availability_ratio"].to_numpy(dtype=float)
+        ratio_nan = np.isnan(ratio)
+        if njit is not None and len(ratio) >= NUMBA_MIN_ROWS:
+            normalized = np.empty_like(ratio)
+            docked_colors = np.empty((len(ratio), 3), dtype=np.uint8)
+            _docked_kernel(ratio, normalized, docked_colors)
+        else:
+            # The feed reports the ratio as a 0-100 percentage.
+            normalized = np.where(ratio_nan, 0.5, ratio / 100.0)
+            docked_colors = ratios_to_colors(normalized)
+            docked_colors[ratio_nan] = [128, 128, 128]
+        ratio_int = np.where(ratio_nan, 0, ratio).astype(int)
+        availability_display = np.where(
+            ratio_nan, "N/A", np.char.add(ratio_int.astype(str), "%")
         )
-        df_docked["info_line"] = df_docked["availability_display"].apply(
-            lambda x: f"Available Ratio: {x}"
+
+        df_docked = df_docked.assign(
+            station_type="Docked",
+            availability_ratio_normalized=normalized,
+            availability_display=availability_display,
+            info_line=np.char.add("Available Ratio: ", availability_display),
         )
 
         df_docked = add_offset_to_duplicates(df_docked, offset=0.0001)
 
-        colors = [
-            ratio_to_color(ratio)
-            for ratio in df_docked["availability_ratio_normalized"]
-        ]
-        df_docked["color"] = colors
+    if len(df_dockless) > 0:
+        available = df_dockless["avg_num_of_available"].to_numpy(dtype=float)
+        available_nan = np.isnan(available)
+        bikes_int = np.where(available_nan, 0, available).astype(int)
+        bikes_display = np.where(available_nan, "N/A", bikes_int.astype(str))
+        df_dockless = df_dockless.assign(
+            station_type="Dockless",
+            radius=np.where(
+                available_nan,
+                8.0,
+                np.where(available >= 10, 25.0, np.maximum(8, 8 + available)),
+            ),
+            bikes_display=bikes_display,
+            info_line=np.char.add("Available bikes: ", bikes_display),
+        )
+
+    return df_docked, df_dockless, docked_colors
+
 
-        docked_layer = pdk.Layer(
+@st.cache_data
+def get_centroid(file_path):
+    """Cached mean station coordinate used to center the initial view."""
+    df = load_data(file_path)
+    return float(df["latitude"].mean()), float(df["longitude"].mean())
+
+
+@st.cache_data
+def get_station_frames(file_path):
+    """Cached docked/dockless frames and colors derived from the station file."""
+    return prepare_station_data(load_data(file_path))
+
+
+@st.cache_data
+def get_filter_bounds(file_path):
+    """Cached slider lower bounds for the docked and dockless filters."""
+    df_docked, df_dockless, _ = get_station_frames(file_path)
+    min_ratio = (
+        float(df_docked["availability_ratio"].min()) if len(df_docked) > 0 else 0.0
+    )
+    min_bikes = (
+        int(df_dockless["avg_num_of_available"].min()) if len(df_dockless) > 0 else 0
+    )
+    return min_ratio, min_bikes
+
+
+@st.cache_data
+def build_layer_spec(file_path, kind, lo, hi):
+    """Build the filtered layer spec for one station subset.
+
+    Keyed on (file_path, kind, lo, hi), so slider reruns that repeat a
+    range reuse the serialized layer instead of re-filtering and
+    re-serializing the frame. Returns the spec and its station count.
+    """
+    df_docked, df_dockless, docked_colors = get_station_frames(file_path)
+
+    if kind == "docked":
+        filtered = df_docked.query("@lo <= availability_ratio <= @hi")
+        # Fast path for the default full-range slider: keep the prepared
+        # frame and color matrix as-is.
+        if len(filtered) == len(df_docked):
+            visible, visible_colors = df_docked, docked_colors
+        else:
+            visible = filtered
+            visible_colors = docked_colors[filtered.index.to_numpy()]
+        layer = pdk.Layer(
             "ScatterplotLayer",
-            data=df_docked,
+            data=visible[DOCKED_SEND_COLS]
+            .round({"longitude": 6, "latitude": 6})
+            # Expand the uint8 color matrix to row lists only here, for
+            # pydeck's serializer.
+            .assign(color=visible_colors.tolist()),
             get_position=["longitude", "latitude"],
             get_fill_color="color",
             get_radius=25,
@@ -111,26 +301,12 @@ def create_map_layers(df):
             auto_highlight=True,
             id="docked_stations",
         )
-        layers.append(docked_layer)
-
-    if len(df_dockless) > 0:
-        df_dockless["station_type"] = "Dockless"
-        df_dockless["radius"] = df_dockless["avg_num_of_available"].apply(
-            lambda x: (
-                25
-                if not pd.isna(x) and x >= 10
-                else max(8, 8 + (x if not pd.isna(x) else 0))
-            )
-        )
-        df_dockless["bikes_display"] = df_dockless["avg_num_of_available"].apply(
-            lambda x: str(int(x)) if not pd.isna(x) else "N/A"
-        )
-        df_dockless["info_line"] = df_dockless["bikes_display"].apply(
-            lambda x: f"Available bikes: {x}"
-        )
-        dockless_layer = pdk.Layer(
+    else:
+        filtered = df_dockless.query("@lo <= avg_num_of_available <= @hi")
+        visible = df_dockless if len(filtered) == len(df_dockless) else filtered
+        layer = pdk.Layer(
             "ScatterplotLayer",
-            data=df_dockless,
+            data=visible[DOCKLESS_SEND_COLS].round({"longitude": 6, "latitude": 6}),
             get_position=["longitude", "latitude"],
             get_fill_color=[0, 120, 255, 180],
             get_radius="radius",
@@ -138,24 +314,25 @@ def create_map_layers(df):
             auto_highlight=True,
             id="dockless_stations",
         )
-        layers.append(dockless_layer)
 
-    return layers, df_docked, df_dockless
+    return json.loads(layer.to_json()), len(visible)
 
 
 try:
     df = load_data(file_path)
     if "latitude" in df.columns and "longitude" in df.columns:
-        layers, df_docked, df_dockless = create_map_layers(df)
+        df_docked, df_dockless, _ = get_station_frames(file_path)
 
         st.sidebar.header("Filters")
         show_docked = st.sidebar.checkbox("Docked Stations", value=True)
         show_dockless = st.sidebar.checkbox("Dockless Stations", value=True)
 
-        if layers:
+        if len(df_docked) > 0 or len(df_dockless) > 0:
             filtered_layers = []
+            visible_docked = 0
+            visible_dockless = 0
+            min_ratio, min_bikes = get_filter_bounds(file_path)
             if show_docked and len(df_docked) > 0:
-                min_ratio = float(df_docked["availability_ratio"].min())
                 ratio_filter = st.sidebar.slider(
                     "Docked: Availability Ratio (%)",
                     min_value=int(min_ratio),
@@ -163,52 +340,29 @@ try:
                     value=(int(min_ratio), 100),
                 )
 
-                df_docked = df_docked[
-                    (df_docked["availability_ratio"] >= ratio_filter[0])
-                    & (df_docked["availability_ratio"] <= ratio_filter[1])
-                ]
-
-                docked_layer = pdk.Layer(
-                    "ScatterplotLayer",
-                    data=df_docked,
-                    get_position=["longitude", "latitude"],
-                    get_fill_color="color",
-                    get_radius=25,
-                    pickable=True,
-                    auto_highlight=True,
-                    id="docked_stations",
+                docked_spec, visible_docked = build_layer_spec(
+                    file_path, "docked", ratio_filter[0], ratio_filter[1]
                 )
-                filtered_layers.append(docked_layer)
+                filtered_layers.append(docked_spec)
 
             if show_dockless and len(df_dockless) > 0:
-                min_bikes = int(df_dockless["avg_num_of_available"].min())
                 bikes_filter = st.sidebar.slider(
                     "Dockless: Avg Available Bikes",
                     min_value=min_bikes,
                     max_value=20,
                     value=(min_bikes, 20),
                 )
-                df_dockless = df_dockless[
-                    (df_dockless["avg_num_of_available"] >= bikes_filter[0])
-                    & (df_dockless["avg_num_of_available"] <= bikes_filter[1])
-                ]
-
-                dockless_layer = pdk.Layer(
-                    "ScatterplotLayer",
-                    data=df_dockless,
-                    get_position=["longitude", "latitude"],
-                    get_fill_color=[0, 120, 255, 180],
-                    get_radius="radius",
-                    pickable=True,
-                    auto_highlight=True,
-                    id="dockless_stations",
+
+                dockless_spec, visible_dockless = build_layer_spec(
+                    file_path, "dockless", bikes_filter[0], bikes_filter[1]
                 )
-                filtered_layers.append(dockless_layer)
+                filtered_layers.append(dockless_spec)
 
             if filtered_layers:
+                center_lat, center_lon = get_centroid(file_path)
                 view_state = pdk.ViewState(
-                    latitude=df["latitude"].mean(),
-                    longitude=df["longitude"].mean(),
+                    latitude=center_lat,
+                    longitude=center_lon,
                     zoom=11,
                     pitch=0,
                 )
@@ -236,8 +390,6 @@ try:
                     "Please select at least one station type to display on the map."
                 )
 
-            visible_docked = len(df_docked) if show_docked else 0
-            visible_dockless = len(df_dockless) if show_dockless else 0
             visible_total = visible_docked + visible_dockless
 
             col1, col2, col3 = st.columns(3)